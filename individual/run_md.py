@@ -4,18 +4,25 @@ Genesis/Mega Drive Checksum Fixer
 Scans directory for .bin and .md files and corrects checksums
 """
 
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Tuple
+from typing import Iterator, Optional, Tuple, Union
+
+GENESIS_SIGNATURES = frozenset({"SEGA MEGA DRIVE", "SEGA GENESIS"})
+CHECKSUM_OFFSET = 0x18E
+CALC_START = 0x200
 
 
 def detect_genesis(data: bytes) -> bool:
     """Check if ROM is Genesis/Mega Drive."""
     if len(data) >= 0x110:
-        try:
-            sig = data[0x100:0x110].decode('utf-8', errors='ignore').strip()
-            return sig == "SEGA MEGA DRIVE" or sig == "SEGA GENESIS"
-        except:
-            pass
+        # Undecodable padding is dropped and whitespace stripped; the rest
+        # must match a console name exactly
+        sig = bytes(data[0x100:0x110]).decode("utf-8", errors="ignore").strip()
+        return sig in GENESIS_SIGNATURES
     return False
 
 
@@ -26,56 +33,78 @@ def read_word(data: bytes, offset: int) -> int:
     return (data[offset] << 8) | data[offset + 1]
 
 
-def fix_genesis_checksum(rom: bytearray) -> Tuple[bool, str]:
-    """Fix Genesis checksum."""
-    CHECKSUM_OFFSET = 0x18E
-    CALC_START = 0x200
-    
+def compute_genesis_checksum(rom: bytes) -> int:
+    """Compute the 16-bit sum of big-endian words from CALC_START."""
+    # High bytes of each word sit at even offsets, low bytes at odd ones,
+    # so two C-level sums replace a per-word loop. A trailing odd byte
+    # is ignored.
+    end = CALC_START + ((len(rom) - CALC_START) & ~1)
+    checksum = (sum(rom[CALC_START:end:2]) << 8) + sum(rom[CALC_START + 1:end:2])
+    return checksum & 0xFFFF
+
+
+def genesis_checksum_patch(checksum: int) -> Tuple[int, bytes]:
+    """File offset and big-endian bytes storing checksum at CHECKSUM_OFFSET."""
+    return CHECKSUM_OFFSET, bytes(((checksum >> 8) & 0xFF, checksum & 0xFF))
+
+
+def fix_genesis_checksum(rom: bytes) -> Tuple[Optional[Tuple[int, bytes]], str]:
+    """
+    Check Genesis checksum.
+    Returns: (patch, message) where patch is (file_offset, bytes) or None
+    """
     if len(rom) < CHECKSUM_OFFSET + 2:
-        return False, "ROM too small"
+        return None, "ROM too small"
     
     # Read header checksum
     header_cs = read_word(rom, CHECKSUM_OFFSET)
     
     # Compute checksum
-    checksum = 0
-    for i in range(CALC_START, len(rom), 2):
-        word = read_word(rom, i)
-        checksum += word
-    
-    checksum = checksum & 0xFFFF
+    checksum = compute_genesis_checksum(rom)
     
     if header_cs == checksum:
-        return False, f"OK: 0x{checksum:04X}"
+        return None, f"OK: 0x{checksum:04X}"
     
-    # Write new checksum
-    rom[CHECKSUM_OFFSET] = (checksum >> 8) & 0xFF
-    rom[CHECKSUM_OFFSET + 1] = checksum & 0xFF
-    
-    return True, f"Fixed: 0x{header_cs:04X} → 0x{checksum:04X}"
+    return genesis_checksum_patch(checksum), f"Fixed: 0x{header_cs:04X} → 0x{checksum:04X}"
 
 
-def process_rom(rom_path: Path) -> None:
-    """Process ROM file."""
-    try:
-        with open(rom_path, "rb") as f:
-            rom = bytearray(f.read())
-        
-        if not detect_genesis(rom):
-            print(f"  ✗ {rom_path.name}: Not a Genesis ROM")
+@contextmanager
+def open_rom(rom_path: Path) -> Iterator[Union[bytes, mmap.mmap]]:
+    """Map a ROM read-only so it can be checked without copying it."""
+    with open(rom_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files cannot be mapped
+            yield b""
             return
-        
-        fixed, msg = fix_genesis_checksum(rom)
-        
-        if fixed:
-            with open(rom_path, "wb") as f:
-                f.write(rom)
-            print(f"  ✓ {rom_path.name}: {msg}")
-        else:
-            print(f"  ○ {rom_path.name}: {msg}")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def write_patch(rom_path: Path, patch: Tuple[int, bytes]) -> None:
+    """Write only the patched bytes back to the ROM file."""
+    file_offset, patch_bytes = patch
+    with open(rom_path, "r+b") as f:
+        f.seek(file_offset)
+        f.write(patch_bytes)
+
+
+def process_rom(rom_path: Path) -> str:
+    """Process ROM file and return its status line."""
+    try:
+        with open_rom(rom_path) as rom:
+            if not detect_genesis(rom):
+                return f"  ✗ {rom_path.name}: Not a Genesis ROM"
+            
+            patch, msg = fix_genesis_checksum(rom)
+            
+            if patch:
+                write_patch(rom_path, patch)
+                return f"  ✓ {rom_path.name}: {msg}"
+            else:
+                return f"  ○ {rom_path.name}: {msg}"
     
     except Exception as e:
-        print(f"  ✗ {rom_path.name}: {e}")
+        return f"  ✗ {rom_path.name}: {e}"
 
 
 def main():
@@ -90,8 +119,10 @@ def main():
         return
     
     print(f"Found {len(roms)} Genesis ROM(s)\n")
-    for rom_path in roms:
-        process_rom(rom_path)
+    # ROMs are independent; check them in parallel and print in scan order
+    with ProcessPoolExecutor() as executor:
+        for line in executor.map(process_rom, roms):
+            print(line)
 
 
 if __name__ == "__main__":
@@ -4,36 +4,48 @@ SNES Batch Checksum Fixer
 Scans directory for .sfc and .smc files and corrects checksums
 """
 
+import mmap
 import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Iterator, Tuple, Optional, Union
 
 HEADER_LOCS = [0x7F00, 0xFF00, 0x407F00, 0x40FF00]
 HEADER_NAME = ["LoROM", "HiROM", "Ex-LoROM", "Ex-HiROM"]
 
 
+def _lookup_table(values) -> bytes:
+    """Build a 256-entry byte table holding 1 at each valid value."""
+    table = bytearray(256)
+    for v in values:
+        table[v] = 1
+    return bytes(table)
+
+
+# Header byte lookup tables: indexing replaces set hashing in the header scan
+VALID_MAP_MODES = _lookup_table({0x20, 0x21, 0x22, 0x23, 0x25, 0x30, 0x31, 0x32, 0x33, 0x35, 0x3A})
+VALID_ROM_TYPES = _lookup_table(
+    t for t in range(256)
+    if t < 3 or ((t >> 4) in {0x0, 0x1, 0x2, 0x3, 0x4, 0x5, 0xE, 0xF} and (t & 0x0F) in {3, 4, 5, 6, 9})
+)
+VALID_BSX_MAPS = _lookup_table({0x20, 0x21, 0x30, 0x31})
+
+
 def check_map_mode(m: int) -> bool:
     """Return True if map mode looks valid for SNES ROMs."""
-    return m in {
-        0x20, 0x21, 0x22, 0x23, 0x25,
-        0x30, 0x31, 0x32, 0x33, 0x35, 0x3A
-    }
+    return VALID_MAP_MODES[m] == 1
 
 
 def check_rom_type(t: int) -> bool:
     """Return True if ROM type code looks valid."""
-    if t < 3:
-        return True
-    hi = t >> 4
-    if hi in {0x0, 0x1, 0x2, 0x3, 0x4, 0x5, 0xE, 0xF}:
-        lo = t & 0x0F
-        return lo in {3, 4, 5, 6, 9}
-    return False
+    return VALID_ROM_TYPES[t] == 1
 
 
 def check_bsx_map(m: int) -> bool:
     """BSX-compatible map modes."""
-    return m in {0x20, 0x21, 0x30, 0x31}
+    return VALID_BSX_MAPS[m] == 1
 
 
 def check_bsx_type(t: int) -> bool:
@@ -51,12 +63,13 @@ def find_snes_header_base(rom: bytes) -> Tuple[Optional[int], Optional[int], Opt
     def valid_at(b: int) -> bool:
         if b + 0xDF >= size:
             return False
+        map_mode, rom_type, rom_size, sram_size, region = struct.unpack_from("5B", rom, b + 0xD5)
         return (
-            check_map_mode(rom[b + 0xD5]) and
-            check_rom_type(rom[b + 0xD6]) and
-            (rom[b + 0xD7] > 6 and rom[b + 0xD7] < 0x0E) and
-            (rom[b + 0xD8] < 8) and
-            (rom[b + 0xD9] < 0x15)
+            check_map_mode(map_mode) and
+            check_rom_type(rom_type) and
+            (rom_size > 6 and rom_size < 0x0E) and
+            (sram_size < 8) and
+            (region < 0x15)
         )
 
     for i in range(4):
@@ -91,8 +104,9 @@ def rom_size_from_header_byte(sz_code: int) -> int:
 def calculate_checksum(rom: bytes, header_base: int, map_mode: int) -> Tuple[int, int]:
     """Compute the 16-bit checksum and its complement as stored in the SNES header."""
     size = len(rom)
-    s = 0x01FE - sum(rom[header_base + 0xDC: header_base + 0xE0])
-    s += sum(rom)
+    # Skip the stored complement/checksum and count them as 0x01FE, which
+    # any valid pair sums to (each complement byte + checksum byte = 0xFF).
+    s = 0x01FE + sum(rom[:header_base + 0xDC]) + sum(rom[header_base + 0xE0:])
 
     declared_bytes = rom_size_from_header_byte(rom[header_base + 0xD7])
 
@@ -105,67 +119,75 @@ def calculate_checksum(rom: bytes, header_base: int, map_mode: int) -> Tuple[int
             data_repeat >>= 1
         data_repeat_offset = size - data_repeat
         if data_repeat < size and data_repeat_offset > 0:
-            for j in range(missing):
-                idx = (j % data_repeat_offset) + data_repeat
-                s += rom[idx]
+            # The mirror repeats rom[data_repeat:size]; sum one period and
+            # scale it instead of visiting every missing byte.
+            full_reps, rem = divmod(missing, data_repeat_offset)
+            s += sum(rom[data_repeat:size]) * full_reps
+            s += sum(rom[data_repeat:data_repeat + rem])
 
     checksum = s & 0xFFFF
     complement = (~checksum) & 0xFFFF
     return checksum, complement
 
 
-def apply_checksum(rom: bytearray, header_base: int, checksum: int, complement: int, offset: int = 0) -> None:
-    """Write complement and checksum to 0xDC..0xDF in the selected header."""
-    rom[offset + header_base + 0xDC] = complement & 0xFF
-    rom[offset + header_base + 0xDD] = (complement >> 8) & 0xFF
-    rom[offset + header_base + 0xDE] = checksum & 0xFF
-    rom[offset + header_base + 0xDF] = (checksum >> 8) & 0xFF
+def checksum_patch(header_base: int, checksum: int, complement: int, offset: int = 0) -> Tuple[int, bytes]:
+    """File offset and bytes storing complement and checksum at 0xDC..0xDF."""
+    return offset + header_base + 0xDC, struct.pack("<HH", complement, checksum)
 
 
-def process_rom(rom_path: Path) -> None:
-    """Process a single SNES ROM file."""
-    try:
-        with open(rom_path, "rb") as f:
-            data = f.read()
-
-        # Detect 512-byte copier header
-        has_copier = (len(data) % 1024) == 512
-        offset = 512 if has_copier else 0
-        
-        # Work with mutable copy
-        patched = bytearray(data)
-        content = patched[offset:]
-
-        base, idx, map_mode, is_bsx = find_snes_header_base(content)
-        if base is None:
-            print(f"  ✗ {rom_path.name}: SNES header not found")
+@contextmanager
+def open_rom(rom_path: Path) -> Iterator[Union[bytes, mmap.mmap]]:
+    """Map a ROM read-only so it can be checked without copying it."""
+    with open(rom_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files cannot be mapped
+            yield b""
             return
-        if is_bsx:
-            print(f"  ○ {rom_path.name}: BSX ROM - skipped")
-            return
-
-        # Get old checksum
-        old_cs = content[base + 0xDE] | (content[base + 0xDF] << 8)
-        old_complement = content[base + 0xDC] | (content[base + 0xDD] << 8)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
 
-        # Calculate new
-        checksum, complement = calculate_checksum(content, base, map_mode)
 
-        if old_cs == checksum and old_complement == complement:
-            print(f"  ○ {rom_path.name}: {HEADER_NAME[idx]} - OK (0x{checksum:04X})")
-            return
+def write_patch(rom_path: Path, patch: Tuple[int, bytes]) -> None:
+    """Write only the patched bytes back to the ROM file."""
+    file_offset, patch_bytes = patch
+    with open(rom_path, "r+b") as f:
+        f.seek(file_offset)
+        f.write(patch_bytes)
 
-        # Apply checksum (write directly to patched with offset)
-        apply_checksum(patched, base, checksum, complement, offset)
 
-        # Write back
-        with open(rom_path, "wb") as f:
-            f.write(patched)
-
-        print(f"  ✓ {rom_path.name}: {HEADER_NAME[idx]} - Fixed (0x{old_cs:04X} → 0x{checksum:04X})")
+def process_rom(rom_path: Path) -> str:
+    """Process a single SNES ROM file and return its status line."""
+    try:
+        with open_rom(rom_path) as data:
+            # Detect 512-byte copier header
+            has_copier = (len(data) % 1024) == 512
+            offset = 512 if has_copier else 0
+            
+            # Skip the copier header; slicing the mapping copies only when one exists
+            content = data[offset:] if offset else data
+            base, idx, map_mode, is_bsx = find_snes_header_base(content)
+            if base is None:
+                return f"  ✗ {rom_path.name}: SNES header not found"
+            if is_bsx:
+                return f"  ○ {rom_path.name}: BSX ROM - skipped"
+
+            # Get old checksum
+            old_cs = content[base + 0xDE] | (content[base + 0xDF] << 8)
+            old_complement = content[base + 0xDC] | (content[base + 0xDD] << 8)
+
+            # Calculate new
+            checksum, complement = calculate_checksum(content, base, map_mode)
+
+            if old_cs == checksum and old_complement == complement:
+                return f"  ○ {rom_path.name}: {HEADER_NAME[idx]} - OK (0x{checksum:04X})"
+
+            # Write only the four header bytes back
+            write_patch(rom_path, checksum_patch(base, checksum, complement, offset))
+
+            return f"  ✓ {rom_path.name}: {HEADER_NAME[idx]} - Fixed (0x{old_cs:04X} → 0x{checksum:04X})"
 
     except Exception as e:
-        print(f"  ✗ {rom_path.name}: Error - {e}")
+        return f"  ✗ {rom_path.name}: Error - {e}"
 
 
 def main():
@@ -179,8 +201,10 @@ def main():
         return
 
     print(f"Found {len(roms)} SNES ROM(s)\n")
-    for rom_path in roms:
-        process_rom(rom_path)
+    # ROMs are independent; check them in parallel and print in scan order
+    with ProcessPoolExecutor() as executor:
+        for line in executor.map(process_rom, roms):
+            print(line)
 
 
 if __name__ == "__main__":
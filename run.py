@@ -4,14 +4,46 @@ Unified ROM Checksum Fixer
 Detects and fixes checksums for Genesis/Mega Drive and SNES ROMs
 """
 
+import json
+import mmap
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Dict, Iterator, List, Set, Tuple, Optional, Union
+
+# Result cache format; bump whenever detection or checksum logic changes
+# so results cached by an older version are discarded
+CACHE_VERSION = 2
+
+# Genesis constants
+GENESIS_SIGNATURES = frozenset({"SEGA MEGA DRIVE", "SEGA GENESIS"})
+CHECKSUM_OFFSET = 0x18E
+CALC_START = 0x200
 
 # SNES constants
 HEADER_LOCS = [0x7F00, 0xFF00, 0x407F00, 0x40FF00]
 HEADER_NAME = ["LoROM", "HiROM", "Ex-LoROM", "Ex-HiROM"]
 
 
+def _lookup_table(values) -> bytes:
+    """Build a 256-entry byte table holding 1 at each valid value."""
+    table = bytearray(256)
+    for v in values:
+        table[v] = 1
+    return bytes(table)
+
+
+# Header byte lookup tables: indexing replaces set hashing in the header scan
+VALID_MAP_MODES = _lookup_table({0x20, 0x21, 0x22, 0x23, 0x25, 0x30, 0x31, 0x32, 0x33, 0x35, 0x3A})
+VALID_ROM_TYPES = _lookup_table(
+    t for t in range(256)
+    if t < 3 or ((t >> 4) in {0x0, 0x1, 0x2, 0x3, 0x4, 0x5, 0xE, 0xF} and (t & 0x0F) in {3, 4, 5, 6, 9})
+)
+VALID_BSX_MAPS = _lookup_table({0x20, 0x21, 0x30, 0x31})
+
+
 # ============================================================================
 # GENESIS/MEGA DRIVE FUNCTIONS
 # ============================================================================
@@ -19,11 +51,10 @@ HEADER_NAME = ["LoROM", "HiROM", "Ex-LoROM", "Ex-HiROM"]
 def detect_genesis(data: bytes) -> bool:
     """Check if ROM is Genesis/Mega Drive."""
     if len(data) >= 0x110:
-        try:
-            sig = data[0x100:0x110].decode('utf-8', errors='ignore').strip()
-            return sig == "SEGA MEGA DRIVE" or sig == "SEGA GENESIS"
-        except:
-            pass
+        # Undecodable padding is dropped and whitespace stripped; the rest
+        # must match a console name exactly
+        sig = bytes(data[0x100:0x110]).decode("utf-8", errors="ignore").strip()
+        return sig in GENESIS_SIGNATURES
     return False
 
 
@@ -34,33 +65,39 @@ def read_word(data: bytes, offset: int) -> int:
     return (data[offset] << 8) | data[offset + 1]
 
 
-def fix_genesis_checksum(rom: bytearray) -> Tuple[bool, str]:
-    """Fix Genesis checksum."""
-    CHECKSUM_OFFSET = 0x18E
-    CALC_START = 0x200
-    
+def compute_genesis_checksum(rom: bytes) -> int:
+    """Compute the 16-bit sum of big-endian words from CALC_START."""
+    # High bytes of each word sit at even offsets, low bytes at odd ones,
+    # so two C-level sums replace a per-word loop. A trailing odd byte
+    # is ignored.
+    end = CALC_START + ((len(rom) - CALC_START) & ~1)
+    checksum = (sum(rom[CALC_START:end:2]) << 8) + sum(rom[CALC_START + 1:end:2])
+    return checksum & 0xFFFF
+
+
+def genesis_checksum_patch(checksum: int) -> Tuple[int, bytes]:
+    """File offset and big-endian bytes storing checksum at CHECKSUM_OFFSET."""
+    return CHECKSUM_OFFSET, bytes(((checksum >> 8) & 0xFF, checksum & 0xFF))
+
+
+def fix_genesis_checksum(rom: bytes) -> Tuple[Optional[Tuple[int, bytes]], str]:
+    """
+    Check Genesis checksum.
+    Returns: (patch, message) where patch is (file_offset, bytes) or None
+    """
     if len(rom) < CHECKSUM_OFFSET + 2:
-        return False, "ROM too small"
+        return None, "ROM too small"
     
     # Read header checksum
     header_cs = read_word(rom, CHECKSUM_OFFSET)
     
     # Compute checksum
-    checksum = 0
-    for i in range(CALC_START, len(rom), 2):
-        word = read_word(rom, i)
-        checksum += word
-    
-    checksum = checksum & 0xFFFF
+    checksum = compute_genesis_checksum(rom)
     
     if header_cs == checksum:
-        return False, f"OK: 0x{checksum:04X}"
-    
-    # Write new checksum
-    rom[CHECKSUM_OFFSET] = (checksum >> 8) & 0xFF
-    rom[CHECKSUM_OFFSET + 1] = checksum & 0xFF
+        return None, f"OK: 0x{checksum:04X}"
     
-    return True, f"Fixed: 0x{header_cs:04X} → 0x{checksum:04X}"
+    return genesis_checksum_patch(checksum), f"Fixed: 0x{header_cs:04X} → 0x{checksum:04X}"
 
 
 # ============================================================================
@@ -69,23 +106,17 @@ def fix_genesis_checksum(rom: bytearray) -> Tuple[bool, str]:
 
 def check_map_mode(m: int) -> bool:
     """Return True if map mode looks valid for SNES ROMs."""
-    return m in {0x20, 0x21, 0x22, 0x23, 0x25, 0x30, 0x31, 0x32, 0x33, 0x35, 0x3A}
+    return VALID_MAP_MODES[m] == 1
 
 
 def check_rom_type(t: int) -> bool:
     """Return True if ROM type code looks valid."""
-    if t < 3:
-        return True
-    hi = t >> 4
-    if hi in {0x0, 0x1, 0x2, 0x3, 0x4, 0x5, 0xE, 0xF}:
-        lo = t & 0x0F
-        return lo in {3, 4, 5, 6, 9}
-    return False
+    return VALID_ROM_TYPES[t] == 1
 
 
 def check_bsx_map(m: int) -> bool:
     """BSX-compatible map modes."""
-    return m in {0x20, 0x21, 0x30, 0x31}
+    return VALID_BSX_MAPS[m] == 1
 
 
 def check_bsx_type(t: int) -> bool:
@@ -103,12 +134,13 @@ def find_snes_header_base(rom: bytes) -> Tuple[Optional[int], Optional[int], Opt
     def valid_at(b: int) -> bool:
         if b + 0xDF >= size:
             return False
+        map_mode, rom_type, rom_size, sram_size, region = struct.unpack_from("5B", rom, b + 0xD5)
         return (
-            check_map_mode(rom[b + 0xD5]) and
-            check_rom_type(rom[b + 0xD6]) and
-            (rom[b + 0xD7] > 6 and rom[b + 0xD7] < 0x0E) and
-            (rom[b + 0xD8] < 8) and
-            (rom[b + 0xD9] < 0x15)
+            check_map_mode(map_mode) and
+            check_rom_type(rom_type) and
+            (rom_size > 6 and rom_size < 0x0E) and
+            (sram_size < 8) and
+            (region < 0x15)
         )
 
     for i in range(4):
@@ -141,8 +173,9 @@ def rom_size_from_header_byte(sz_code: int) -> int:
 def calculate_snes_checksum(rom: bytes, header_base: int, map_mode: int) -> Tuple[int, int]:
     """Compute the 16-bit checksum and its complement as stored in the SNES header."""
     size = len(rom)
-    s = 0x01FE - sum(rom[header_base + 0xDC: header_base + 0xE0])
-    s += sum(rom)
+    # Skip the stored complement/checksum and count them as 0x01FE, which
+    # any valid pair sums to (each complement byte + checksum byte = 0xFF).
+    s = 0x01FE + sum(rom[:header_base + 0xDC]) + sum(rom[header_base + 0xE0:])
 
     declared_bytes = rom_size_from_header_byte(rom[header_base + 0xD7])
 
@@ -155,32 +188,34 @@ def calculate_snes_checksum(rom: bytes, header_base: int, map_mode: int) -> Tupl
             data_repeat >>= 1
         data_repeat_offset = size - data_repeat
         if data_repeat < size and data_repeat_offset > 0:
-            for j in range(missing):
-                idx = (j % data_repeat_offset) + data_repeat
-                s += rom[idx]
+            # The mirror repeats rom[data_repeat:size]; sum one period and
+            # scale it instead of visiting every missing byte.
+            full_reps, rem = divmod(missing, data_repeat_offset)
+            s += sum(rom[data_repeat:size]) * full_reps
+            s += sum(rom[data_repeat:data_repeat + rem])
 
     checksum = s & 0xFFFF
     complement = (~checksum) & 0xFFFF
     return checksum, complement
 
 
-def apply_snes_checksum(rom: bytearray, header_base: int, checksum: int, complement: int, offset: int = 0) -> None:
-    """Write complement and checksum to 0xDC..0xDF in the selected header."""
-    rom[offset + header_base + 0xDC] = complement & 0xFF
-    rom[offset + header_base + 0xDD] = (complement >> 8) & 0xFF
-    rom[offset + header_base + 0xDE] = checksum & 0xFF
-    rom[offset + header_base + 0xDF] = (checksum >> 8) & 0xFF
-
+def snes_checksum_patch(header_base: int, checksum: int, complement: int, offset: int = 0) -> Tuple[int, bytes]:
+    """File offset and bytes storing complement and checksum at 0xDC..0xDF."""
+    return offset + header_base + 0xDC, struct.pack("<HH", complement, checksum)
 
-def fix_snes_checksum(patched: bytearray, offset: int) -> Tuple[bool, str]:
-    """Fix SNES checksum."""
-    content = patched[offset:]
 
+def fix_snes_checksum(data: bytes, offset: int) -> Tuple[Optional[Tuple[int, bytes]], str]:
+    """
+    Check SNES checksum.
+    Returns: (patch, message) where patch is (file_offset, bytes) or None
+    """
+    # Skip the copier header; slicing the mapping copies only when one exists
+    content = data[offset:] if offset else data
     base, idx, map_mode, is_bsx = find_snes_header_base(content)
     if base is None:
-        return False, "SNES header not found"
+        return None, "SNES header not found"
     if is_bsx:
-        return False, "BSX ROM - skipped"
+        return None, "BSX ROM - skipped"
 
     # Get old checksum
     old_cs = content[base + 0xDE] | (content[base + 0xDF] << 8)
@@ -190,12 +225,10 @@ def fix_snes_checksum(patched: bytearray, offset: int) -> Tuple[bool, str]:
     checksum, complement = calculate_snes_checksum(content, base, map_mode)
 
     if old_cs == checksum and old_complement == complement:
-        return False, f"{HEADER_NAME[idx]} - OK (0x{checksum:04X})"
-
-    # Apply checksum
-    apply_snes_checksum(patched, base, checksum, complement, offset)
+        return None, f"{HEADER_NAME[idx]} - OK (0x{checksum:04X})"
 
-    return True, f"{HEADER_NAME[idx]} - Fixed (0x{old_cs:04X} → 0x{checksum:04X})"
+    patch = snes_checksum_patch(base, checksum, complement, offset)
+    return patch, f"{HEADER_NAME[idx]} - Fixed (0x{old_cs:04X} → 0x{checksum:04X})"
 
 
 # ============================================================================
@@ -210,69 +243,186 @@ def detect_rom_type(data: bytes) -> Optional[str]:
     # Check for SNES
     has_copier = (len(data) % 1024) == 512
     offset = 512 if has_copier else 0
-    content = data[offset:]
-    
+    # Skip the copier header; slicing the mapping copies only when one exists
+    content = data[offset:] if offset else data
     base, _, _, _ = find_snes_header_base(content)
+
     if base is not None:
         return "snes"
     
     return None
 
 
-def process_rom(rom_path: Path) -> None:
-    """Process a ROM file (Genesis or SNES)."""
+@contextmanager
+def open_rom(rom_path: Path) -> Iterator[Union[bytes, mmap.mmap]]:
+    """Map a ROM read-only so it can be checked without copying it."""
+    with open(rom_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files cannot be mapped
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def write_patch(rom_path: Path, patch: Tuple[int, bytes]) -> None:
+    """Write only the patched bytes back to the ROM file."""
+    file_offset, patch_bytes = patch
+    with open(rom_path, "r+b") as f:
+        f.seek(file_offset)
+        f.write(patch_bytes)
+
+
+def process_rom(rom_path: Path) -> Tuple[str, bool]:
+    """
+    Process a ROM file (Genesis or SNES).
+    Returns: (status_line, cacheable) where cacheable means the file was
+    recognised, checked and left as is, so the result may be cached.
+    """
     try:
-        with open(rom_path, "rb") as f:
-            data = f.read()
-        
-        rom_type = detect_rom_type(data)
-        
-        if rom_type == "genesis":
-            rom = bytearray(data)
-            fixed, msg = fix_genesis_checksum(rom)
+        with open_rom(rom_path) as data:
+            rom_type = detect_rom_type(data)
             
-            if fixed:
-                with open(rom_path, "wb") as f:
-                    f.write(rom)
-                print(f"  ✓ {rom_path.name} (Genesis): {msg}")
-            else:
-                print(f"  ○ {rom_path.name} (Genesis): {msg}")
-        
-        elif rom_type == "snes":
-            patched = bytearray(data)
-            has_copier = (len(patched) % 1024) == 512
-            offset = 512 if has_copier else 0
+            if rom_type == "genesis":
+                patch, msg = fix_genesis_checksum(data)
+                
+                if patch:
+                    write_patch(rom_path, patch)
+                    return f"  ✓ {rom_path.name} (Genesis): {msg}", False
+                else:
+                    return f"  ○ {rom_path.name} (Genesis): {msg}", True
             
-            fixed, msg = fix_snes_checksum(patched, offset)
+            elif rom_type == "snes":
+                has_copier = (len(data) % 1024) == 512
+                offset = 512 if has_copier else 0
+                
+                patch, msg = fix_snes_checksum(data, offset)
+                
+                if patch:
+                    write_patch(rom_path, patch)
+                    return f"  ✓ {rom_path.name} (SNES): {msg}", False
+                else:
+                    # A missing header is a negative result; never cache it
+                    return f"  ○ {rom_path.name} (SNES): {msg}", msg != "SNES header not found"
             
-            if fixed:
-                with open(rom_path, "wb") as f:
-                    f.write(patched)
-                print(f"  ✓ {rom_path.name} (SNES): {msg}")
             else:
-                print(f"  ○ {rom_path.name} (SNES): {msg}")
-        
-        else:
-            print(f"  ✗ {rom_path.name}: Unknown ROM type")
+                return f"  ✗ {rom_path.name}: Unknown ROM type", False
     
     except Exception as e:
-        print(f"  ✗ {rom_path.name}: Error - {e}")
+        return f"  ✗ {rom_path.name}: Error - {e}", False
+
+
+def find_roms(directory: Path, extensions: Set[str]) -> List[Path]:
+    """Recursively collect files with a ROM extension, sorted by path."""
+    roms = []
+    pending = [directory]
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except PermissionError:
+            continue
+        with entries:
+            for entry in entries:
+                # Directory entries carry their type, so only ROM-named
+                # files (or symlinks to them) ever need a stat call
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in extensions and entry.is_file():
+                    roms.append(Path(entry.path))
+    return sorted(roms)
+
+
+# ============================================================================
+# RESULT CACHE
+# ============================================================================
+
+def cache_path() -> Path:
+    """Location of the result cache; an empty XDG_CACHE_HOME counts as unset."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "fixchecksum" / "index.json"
+
+
+def load_cache() -> Dict[str, list]:
+    """Load cached results: path -> [size, mtime_ns, status_line]."""
+    try:
+        with open(cache_path(), "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+        return {}
+    entries = cache.get("entries")
+    if not isinstance(entries, dict):
+        return {}
+    # Drop malformed entries so they are simply treated as misses
+    return {path: entry for path, entry in entries.items()
+            if isinstance(entry, list) and len(entry) == 3 and isinstance(entry[2], str)}
+
+
+def save_cache(cache: Dict[str, list]) -> None:
+    """Write the cache atomically; a failed write only costs a rescan."""
+    path = cache_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "entries": cache}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def file_stamp(rom_path: Path) -> Optional[list]:
+    """Size and mtime identifying the current contents of a file, if readable."""
+    try:
+        st = rom_path.stat()
+    except OSError:
+        # Left to process_rom, which reports the error for this file
+        return None
+    return [st.st_size, st.st_mtime_ns]
 
 
 def main():
     """Scan directory and subdirectories for ROM checksums."""
     current_dir = Path.cwd()
     extensions = {".bin", ".md", ".sfc", ".smc"}
-    roms = sorted([f for f in current_dir.rglob("*") 
-                   if f.is_file() and f.suffix.lower() in extensions])
+    roms = find_roms(current_dir, extensions)
     
     if not roms:
         print("No ROM files found (.bin, .md, .sfc, .smc)")
         return
     
     print(f"Found {len(roms)} ROM file(s)\n")
-    for rom_path in roms:
-        process_rom(rom_path)
+    
+    # Skip ROMs whose size and mtime match a cached result
+    cache = load_cache()
+    stamps = {rom_path: file_stamp(rom_path) for rom_path in roms}
+    pending = [rom_path for rom_path in roms
+               if stamps[rom_path] is None or cache.get(str(rom_path), [])[:2] != stamps[rom_path]]
+    
+    # Forget cached files under this directory that are gone
+    prefix = os.path.join(str(current_dir), "")
+    scanned = {str(rom_path) for rom_path in roms}
+    for key in [key for key in cache if key.startswith(prefix) and key not in scanned]:
+        del cache[key]
+    
+    # ROMs are independent; check them in parallel and print in scan order
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(process_rom, pending)
+        pending_set = set(pending)
+        for rom_path in roms:
+            key = str(rom_path)
+            if rom_path in pending_set:
+                line, cacheable = next(results)
+                if cacheable and stamps[rom_path] is not None:
+                    cache[key] = stamps[rom_path] + [line]
+                else:
+                    cache.pop(key, None)
+            else:
+                line = cache[key][2]
+            print(line)
+    
+    save_cache(cache)
 
 
 if __name__ == "__main__":